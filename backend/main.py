@@ -1,25 +1,71 @@
+import asyncio
+import functools
+import logging
+import math
+import os
+import sqlite3
+import time
 from typing import List, Optional
 from datetime import datetime, timedelta, timezone
 from fastapi import Depends, FastAPI, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from jose import JWTError, jwt
+import jwt
 import bcrypt
+import orjson
 from pydantic import BaseModel, EmailStr, Field
-from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, String, create_engine
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Index, Integer, String, create_engine, event, exists, insert, select
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import Session, relationship, sessionmaker
+from sqlalchemy.pool import QueuePool
 
 # Simple local SQLite DB; for cloud deploy, switch the DATABASE_URL to
 # a managed PostgreSQL/MySQL instance (RDS/Cloud SQL) with the same models.
 # TODO: With more time, migrate to PostgreSQL for production scalability
 DATABASE_URL = "sqlite:///./blinktracker_new.db"
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# Explicit pool so concurrent requests resolving get_db reuse connections
+# instead of serializing on connection setup; the busy timeout keeps WAL
+# readers from failing fast with SQLITE_BUSY while a write is in flight.
+engine = create_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False, "timeout": 30},
+    poolclass=QueuePool,
+    pool_size=10,
+    max_overflow=20,
+    pool_pre_ping=True,
+    pool_recycle=1800,
+)
+
+
+@event.listens_for(Engine, "connect")
+def _set_sqlite_pragma(dbapi_con, _connection_record):
+    # WAL lets readers and the writer proceed concurrently, and NORMAL sync
+    # drops the per-commit fsync that the default journal mode pays.
+    if not isinstance(dbapi_con, sqlite3.Connection):
+        return
+    cur = dbapi_con.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.execute("PRAGMA temp_store=MEMORY")
+    cur.execute("PRAGMA mmap_size=268435456")
+    cur.execute("PRAGMA cache_size=-65536")
+    # Needed for ON DELETE CASCADE on blink_sessions.user_id
+    cur.execute("PRAGMA foreign_keys=ON")
+    cur.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
+def _utcnow() -> datetime:
+    # datetime.UTC only exists on Python 3.11+; timezone.utc works everywhere
+    return datetime.now(timezone.utc)
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -29,16 +75,18 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     consent_given_at = Column(DateTime, nullable=True)
 
-    sessions = relationship("BlinkSession", back_populates="user")
+    sessions = relationship(
+        "BlinkSession", back_populates="user", cascade="all, delete-orphan", passive_deletes=True
+    )
 
 
 class BlinkSession(Base):
     __tablename__ = "blink_sessions"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    started_at = Column(DateTime, default=lambda: datetime.now(datetime.UTC))
-    ended_at = Column(DateTime, default=lambda: datetime.now(datetime.UTC))
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    started_at = Column(DateTime, default=_utcnow)
+    ended_at = Column(DateTime, default=_utcnow)
     blink_count = Column(Integer, default=0)
     avg_cpu = Column(Float, default=0.0)
     avg_memory_mb = Column(Float, default=0.0)
@@ -46,26 +94,98 @@ class BlinkSession(Base):
     user = relationship("User", back_populates="sessions")
 
 
+# Serves the per-user listing/export queries as an index range scan with rows
+# already in started_at DESC order, avoiding a scan + in-memory sort.
+ix_blink_sessions_user_started = Index(
+    "ix_blink_sessions_user_started", BlinkSession.user_id, BlinkSession.started_at.desc()
+)
+
+
+def _ensure_blink_sessions_cascade(bind) -> None:
+    """Rebuild a pre-existing blink_sessions table whose user FK lacks CASCADE.
+
+    SQLite can't ALTER a foreign key, so the table is renamed, recreated from
+    the model and the rows copied across.
+    """
+    if bind.dialect.name != "sqlite":
+        return
+    with bind.connect() as conn:
+        fks = conn.exec_driver_sql("PRAGMA foreign_key_list(blink_sessions)").fetchall()
+        # Row layout: id, seq, table, from, to, on_update, on_delete, match
+        if not any(fk[2] == "users" and fk[6] != "CASCADE" for fk in fks):
+            return
+        # Must be switched off outside a transaction or SQLite ignores it
+        conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
+        try:
+            conn.exec_driver_sql("ALTER TABLE blink_sessions RENAME TO _blink_sessions_old")
+            # Indexes follow the renamed table; drop them so the names are free
+            old_indexes = conn.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'index' "
+                "AND tbl_name = '_blink_sessions_old' AND sql IS NOT NULL"
+            ).fetchall()
+            for (name,) in old_indexes:
+                conn.exec_driver_sql(f'DROP INDEX "{name}"')
+            BlinkSession.__table__.create(bind=conn)
+            columns = ", ".join(c.name for c in BlinkSession.__table__.columns)
+            conn.exec_driver_sql(
+                f"INSERT INTO blink_sessions ({columns}) SELECT {columns} FROM _blink_sessions_old"
+            )
+            conn.exec_driver_sql("DROP TABLE _blink_sessions_old")
+            conn.commit()
+        finally:
+            conn.exec_driver_sql("PRAGMA foreign_keys=ON")
+
+
 Base.metadata.create_all(bind=engine)
+_ensure_blink_sessions_cascade(engine)
+# create_all only builds indexes for new tables; add them to existing DBs too
+for _index in BlinkSession.__table__.indexes:
+    _index.create(bind=engine, checkfirst=True)
 
 
 # Auth configuration (demo‑level; for production use env vars and rotation)
 SECRET_KEY = "change-me-in-prod"
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", str(60 * 24)))
+# uvicorn configures this logger, so startup messages reach the server log
+logger = logging.getLogger("uvicorn.error")
+
+BCRYPT_MIN_ROUNDS = 10
+BCRYPT_MAX_ROUNDS = 14
+BCRYPT_TARGET_SECONDS = 0.25
+
+
+def _calibrate_bcrypt_rounds() -> int:
+    """Pick the highest work factor whose hash time stays under the target.
+
+    Each extra round doubles the cost, so a single timed hash at the minimum
+    cost is enough to extrapolate.
+    """
+    start = time.perf_counter()
+    bcrypt.hashpw(b"x" * 16, bcrypt.gensalt(rounds=BCRYPT_MIN_ROUNDS))
+    elapsed = time.perf_counter() - start
+    extra = int(math.log2(BCRYPT_TARGET_SECONDS / elapsed)) if elapsed < BCRYPT_TARGET_SECONDS else 0
+    return min(BCRYPT_MIN_ROUNDS + extra, BCRYPT_MAX_ROUNDS)
+
+
+# bcrypt work factor; set BCRYPT_ROUNDS to pin it, otherwise calibrated to this CPU
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS") or _calibrate_bcrypt_rounds())
+logger.info("Using bcrypt work factor %d", BCRYPT_ROUNDS)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
 
 class Token(BaseModel):
     access_token: str
     token_type: str
 
 
-class TokenData(BaseModel):
-    email: Optional[str] = None
-
-
 class UserCreate(BaseModel):
     email: EmailStr
     full_name: Optional[str] = None
@@ -102,7 +222,14 @@ class BlinkSessionOut(BaseModel):
         from_attributes = True
 
 
-app = FastAPI(title="WaW Eye Tracker Backend")
+class OrjsonResponse(JSONResponse):
+    """JSONResponse rendered by orjson, which serializes datetimes and numbers in C."""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+
+
+app = FastAPI(title="WaW Eye Tracker Backend", default_response_class=OrjsonResponse)
 
 # CORS middleware
 app.add_middleware(
@@ -113,6 +240,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger JSON/NDJSON bodies (session lists, exports); repeated keys
+# compress well. Streaming responses are compressed chunk by chunk.
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
 
 # Dependency
 
@@ -135,7 +266,7 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     # Truncate password to 72 bytes as required by bcrypt
     password_bytes = password.encode('utf-8')[:72]
-    return bcrypt.hashpw(password_bytes, bcrypt.gensalt()).decode('utf-8')
+    return bcrypt.hashpw(password_bytes, bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -146,51 +277,78 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
+@functools.lru_cache(maxsize=4096)
+def _decode_cached(token: str) -> dict:
+    # Failed decodes raise and are never cached; only verified payloads are
+    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+
+def decode_access_token(token: str) -> dict:
+    """Verify a JWT, reusing the cached payload for tokens already seen."""
+    payload = _decode_cached(token)
+    # A cache hit skips PyJWT's own exp check, so re-check expiry here
+    exp = payload.get("exp")
+    if exp is not None and exp <= time.time():
+        raise jwt.ExpiredSignatureError("Signature has expired")
+    return payload
+
+
 def get_user_by_email(db: Session, email: str) -> Optional[User]:
     return db.query(User).filter(User.email == email).first()
 
 
-def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
+def user_exists(db: Session, email: str) -> bool:
+    # EXISTS probe: returns a single scalar without hydrating a User row
+    return db.scalar(select(exists().where(User.email == email)))
+
+
+async def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
     user = get_user_by_email(db, email=email)
-    if not user or not verify_password(password, user.hashed_password):
+    # bcrypt is CPU-bound; run it in a worker thread so the event loop stays free
+    if not user or not await asyncio.to_thread(verify_password, password, user.hashed_password):
         return None
     return user
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+def _email_from_token(token: str) -> str:
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        token_data = TokenData(email=email)
-    except JWTError:
+        payload = decode_access_token(token)
+    except jwt.PyJWTError:
+        raise credentials_exception
+    email = payload.get("sub")
+    if email is None:
         raise credentials_exception
+    return email
 
-    user = get_user_by_email(db, email=token_data.email)
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+    user = get_user_by_email(db, email=_email_from_token(token))
     if user is None:
         raise credentials_exception
     return user
 
 
+async def current_user_id(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> int:
+    """Lighter variant of get_current_user for routes that only need the id."""
+    user_id = db.scalar(select(User.id).where(User.email == _email_from_token(token)))
+    if user_id is None:
+        raise credentials_exception
+    return user_id
+
+
 # Routes
 
 
 @app.post("/auth/register", response_model=UserOut)
 async def register(user_in: UserCreate, db: Session = Depends(get_db)):
-    existing = get_user_by_email(db, user_in.email)
-    if existing:
+    if user_exists(db, user_in.email):
         raise HTTPException(status_code=400, detail="Email already registered")
 
+    hashed_password = await asyncio.to_thread(get_password_hash, user_in.password)
     user = User(
         email=user_in.email,
         full_name=user_in.full_name,
-        hashed_password=get_password_hash(user_in.password),
+        hashed_password=hashed_password,
         consent_given_at=datetime.now(timezone.utc) if user_in.consent else None,
     )
     db.add(user)
@@ -203,7 +361,7 @@ async def register(user_in: UserCreate, db: Session = Depends(get_db)):
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
 ):
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -223,10 +381,10 @@ async def read_me(current_user: User = Depends(get_current_user)):
 async def create_blink_session(
     session_in: BlinkSessionCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    user_id: int = Depends(current_user_id),
 ):
     session = BlinkSession(
-        user_id=current_user.id,
+        user_id=user_id,
         started_at=session_in.started_at,
         ended_at=session_in.ended_at,
         blink_count=session_in.blink_count,
@@ -239,6 +397,22 @@ async def create_blink_session(
     return session
 
 
+@app.post("/blink-sessions/bulk")
+async def create_blink_sessions_bulk(
+    sessions_in: List[BlinkSessionCreate],
+    db: Session = Depends(get_db),
+    user_id: int = Depends(current_user_id),
+):
+    """Insert many sessions in one request and one commit (used by offline sync)."""
+    if sessions_in:
+        db.execute(
+            insert(BlinkSession),
+            [{"user_id": user_id, **session_in.model_dump()} for session_in in sessions_in],
+        )
+        db.commit()
+    return {"inserted": len(sessions_in)}
+
+
 @app.get("/me/blink-sessions", response_model=List[BlinkSessionOut])
 async def list_my_blink_sessions(
     db: Session = Depends(get_db),
@@ -259,36 +433,43 @@ async def export_user_data(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    """Export all user data for GDPR compliance."""
-    sessions = (
-        db.query(BlinkSession)
-        .filter(BlinkSession.user_id == current_user.id)
-        .order_by(BlinkSession.started_at.desc())
-        .all()
-    )
+    """Export all user data for GDPR compliance.
 
-    export_data = {
+    Streamed as NDJSON: a header line with the user record, then one line per
+    blink session, so memory stays flat regardless of how many sessions exist.
+    """
+    header = {
         "user": {
             "id": current_user.id,
             "email": current_user.email,
             "full_name": current_user.full_name,
-            "consent_given_at": current_user.consent_given_at.isoformat() if current_user.consent_given_at else None,
+            "consent_given_at": current_user.consent_given_at,
         },
-        "blink_sessions": [
-            {
-                "id": session.id,
-                "started_at": session.started_at.isoformat(),
-                "ended_at": session.ended_at.isoformat(),
-                "blink_count": session.blink_count,
-                "avg_cpu": session.avg_cpu,
-                "avg_memory_mb": session.avg_memory_mb,
-            }
-            for session in sessions
-        ],
-        "export_date": datetime.now(timezone.utc).isoformat(),
+        "export_date": datetime.now(timezone.utc),
     }
+    # Core select of plain columns: rows stream as mappings without building
+    # ORM objects, and orjson encodes the datetimes directly.
+    sessions = BlinkSession.__table__.c
+    stmt = (
+        select(
+            sessions.id,
+            sessions.started_at,
+            sessions.ended_at,
+            sessions.blink_count,
+            sessions.avg_cpu,
+            sessions.avg_memory_mb,
+        )
+        .where(sessions.user_id == current_user.id)
+        .order_by(sessions.started_at.desc())
+        .execution_options(yield_per=500)
+    )
+
+    def generate():
+        yield orjson.dumps(header, option=orjson.OPT_UTC_Z) + b"\n"
+        for row in db.execute(stmt).mappings():
+            yield orjson.dumps(dict(row), option=orjson.OPT_UTC_Z) + b"\n"
 
-    return export_data
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
 
 
 @app.delete("/me/delete")
@@ -297,10 +478,7 @@ async def delete_user_account(
     current_user: User = Depends(get_current_user),
 ):
     """Delete user account and all associated data for GDPR compliance."""
-    # Delete all blink sessions first
-    db.query(BlinkSession).filter(BlinkSession.user_id == current_user.id).delete()
-
-    # Delete the user
+    # Blink sessions are removed by the database via ON DELETE CASCADE
     db.delete(current_user)
     db.commit()
 
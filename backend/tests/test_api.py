@@ -1,9 +1,14 @@
+import json
+import time
+from datetime import timedelta
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 
-from main import app, Base, get_db, User, BlinkSession
+from main import app, Base, get_db, User, BlinkSession, _ensure_blink_sessions_cascade, create_access_token
 
 # Test database
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test_new.db"
@@ -11,6 +16,8 @@ engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base.metadata.create_all(bind=engine)
+# Same startup upgrade main.py applies to its own database
+_ensure_blink_sessions_cascade(engine)
 
 def override_get_db():
     try:
@@ -143,6 +150,27 @@ def test_get_me():
     data = response.json()
     assert data["email"] == "test@example.com"
 
+def test_expired_token_rejected_on_cache_hit(monkeypatch):
+    user_data = {
+        "email": "test@example.com",
+        "full_name": "Test User",
+        "password": "testpass123",
+        "consent": True
+    }
+    client.post("/auth/register", json=user_data)
+    token = create_access_token(data={"sub": "test@example.com"}, expires_delta=timedelta(seconds=30))
+
+    # First use decodes the token and caches the payload
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.get("/me", headers=headers)
+    assert response.status_code == 200
+
+    # Past expiry the cached payload must still be rejected
+    expired_at = time.time() + 60
+    monkeypatch.setattr(time, "time", lambda: expired_at)
+    response = client.get("/me", headers=headers)
+    assert response.status_code == 401
+
 def test_create_blink_session():
     # Register and login
     user_data = {
@@ -206,6 +234,182 @@ def test_get_blink_sessions():
     assert len(data) >= 1
     assert data[0]["blink_count"] == 150
 
+def test_create_blink_sessions_bulk():
+    # Register and login
+    user_data = {
+        "email": "test@example.com",
+        "full_name": "Test User",
+        "password": "testpass123",
+        "consent": True
+    }
+    client.post("/auth/register", json=user_data)
+    login_data = {
+        "username": "test@example.com",
+        "password": "testpass123"
+    }
+    response = client.post("/auth/token", data=login_data)
+    token = response.json()["access_token"]
+
+    headers = {"Authorization": f"Bearer {token}"}
+    sessions = [
+        {
+            "started_at": f"2024-01-0{day}T10:00:00",
+            "ended_at": f"2024-01-0{day}T10:30:00",
+            "blink_count": 100 + day,
+            "avg_cpu": 25.5,
+            "avg_memory_mb": 512.0
+        }
+        for day in range(1, 4)
+    ]
+    response = client.post("/blink-sessions/bulk", json=sessions, headers=headers)
+    assert response.status_code == 200
+    assert response.json() == {"inserted": 3}
+
+    response = client.get("/me/blink-sessions", headers=headers)
+    data = response.json()
+    assert len(data) == 3
+    assert data[0]["blink_count"] == 103
+
+def test_export_user_data():
+    # Register and login
+    user_data = {
+        "email": "test@example.com",
+        "full_name": "Test User",
+        "password": "testpass123",
+        "consent": True
+    }
+    client.post("/auth/register", json=user_data)
+    login_data = {
+        "username": "test@example.com",
+        "password": "testpass123"
+    }
+    response = client.post("/auth/token", data=login_data)
+    token = response.json()["access_token"]
+
+    headers = {"Authorization": f"Bearer {token}"}
+    session_data = {
+        "started_at": "2024-01-01T10:00:00",
+        "ended_at": "2024-01-01T10:30:00",
+        "blink_count": 150,
+        "avg_cpu": 25.5,
+        "avg_memory_mb": 512.0
+    }
+    client.post("/blink-sessions", json=session_data, headers=headers)
+
+    response = client.get("/me/export", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[0]["user"]["email"] == "test@example.com"
+    assert len(lines) == 2
+    assert lines[1]["blink_count"] == 150
+
+def test_delete_account_removes_sessions():
+    # Register and login
+    user_data = {
+        "email": "test@example.com",
+        "full_name": "Test User",
+        "password": "testpass123",
+        "consent": True
+    }
+    client.post("/auth/register", json=user_data)
+    login_data = {
+        "username": "test@example.com",
+        "password": "testpass123"
+    }
+    response = client.post("/auth/token", data=login_data)
+    token = response.json()["access_token"]
+
+    headers = {"Authorization": f"Bearer {token}"}
+    session_data = {
+        "started_at": "2024-01-01T10:00:00",
+        "ended_at": "2024-01-01T10:30:00",
+        "blink_count": 150,
+        "avg_cpu": 25.5,
+        "avg_memory_mb": 512.0
+    }
+    client.post("/blink-sessions", json=session_data, headers=headers)
+
+    response = client.delete("/me/delete", headers=headers)
+    assert response.status_code == 200
+
+    db = TestingSessionLocal()
+    try:
+        assert db.query(User).count() == 0
+        assert db.query(BlinkSession).count() == 0
+    finally:
+        db.close()
+
+def test_delete_account_on_legacy_schema():
+    # Table as created before blink_sessions.user_id had ON DELETE CASCADE
+    legacy_engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    User.__table__.create(bind=legacy_engine)
+    with legacy_engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE blink_sessions ("
+            "id INTEGER NOT NULL PRIMARY KEY, "
+            "user_id INTEGER NOT NULL REFERENCES users (id), "
+            "started_at DATETIME, ended_at DATETIME, blink_count INTEGER, "
+            "avg_cpu FLOAT, avg_memory_mb FLOAT)"
+        )
+        conn.exec_driver_sql("CREATE INDEX ix_blink_sessions_user_id ON blink_sessions (user_id)")
+
+    _ensure_blink_sessions_cascade(legacy_engine)
+
+    with legacy_engine.connect() as conn:
+        fks = conn.exec_driver_sql("PRAGMA foreign_key_list(blink_sessions)").fetchall()
+    assert [fk[6] for fk in fks] == ["CASCADE"]
+
+    LegacySessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=legacy_engine)
+
+    def override_legacy_db():
+        try:
+            db = LegacySessionLocal()
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_legacy_db
+    try:
+        user_data = {
+            "email": "test@example.com",
+            "full_name": "Test User",
+            "password": "testpass123",
+            "consent": True
+        }
+        client.post("/auth/register", json=user_data)
+        login_data = {
+            "username": "test@example.com",
+            "password": "testpass123"
+        }
+        response = client.post("/auth/token", data=login_data)
+        token = response.json()["access_token"]
+
+        headers = {"Authorization": f"Bearer {token}"}
+        session_data = {
+            "started_at": "2024-01-01T10:00:00",
+            "ended_at": "2024-01-01T10:30:00",
+            "blink_count": 150,
+            "avg_cpu": 25.5,
+            "avg_memory_mb": 512.0
+        }
+        client.post("/blink-sessions", json=session_data, headers=headers)
+
+        response = client.delete("/me/delete", headers=headers)
+        assert response.status_code == 200
+    finally:
+        app.dependency_overrides[get_db] = override_get_db
+
+    db = LegacySessionLocal()
+    try:
+        assert db.query(User).count() == 0
+        assert db.query(BlinkSession).count() == 0
+    finally:
+        db.close()
+    legacy_engine.dispose()
+
 def test_unauthorized_access():
     response = client.get("/me")
     assert response.status_code == 401
@@ -1,19 +1,36 @@
 import json
 import os
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 API_BASE_URL = os.getenv("WAW_API_BASE_URL", "http://127.0.0.1:8000")
 TOKEN_PATH = os.path.join(os.path.dirname(__file__), ".token.json")
-BUFFER_PATH = os.path.join(os.path.dirname(__file__), "blink_buffer.json")
+# Append-only NDJSON: one buffered session per line
+BUFFER_PATH = os.path.join(os.path.dirname(__file__), "blink_buffer.ndjson")
+LEGACY_BUFFER_PATH = os.path.join(os.path.dirname(__file__), "blink_buffer.json")
 
 
 class ApiClient:
     def __init__(self):
         self._token: Optional[str] = None
+        # Persistent session so repeated syncs reuse the same TCP/TLS connection
+        self._session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=8,
+            # Only connection failures are retried: every call is a POST, and
+            # re-sending the bulk upload after a server-side error could
+            # insert the same sessions twice.
+            max_retries=Retry(total=3, backoff_factor=0.2),
+        )
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
         self._load_token()
+        self._migrate_legacy_buffer()
 
     # ---------------- Token management ----------------
     def _load_token(self):
@@ -24,9 +41,16 @@ class ApiClient:
                     self._token = data.get("access_token")
             except Exception:
                 self._token = None
+        if self._token:
+            self._set_auth_header(self._token)
+
+    def _set_auth_header(self, token: str):
+        # Attached once to the session instead of being rebuilt per request
+        self._session.headers["Authorization"] = f"Bearer {token}"
 
     def _save_token(self, token: str):
         self._token = token
+        self._set_auth_header(token)
         try:
             with open(TOKEN_PATH, "w", encoding="utf-8") as f:
                 json.dump({"access_token": token}, f)
@@ -43,7 +67,7 @@ class ApiClient:
         url = f"{API_BASE_URL}/auth/token"
         data = {"username": email, "password": password}
         try:
-            resp = requests.post(url, data=data, timeout=10)
+            resp = self._session.post(url, data=data, timeout=10)
             if resp.status_code != 200:
                 print(f"Login failed: HTTP {resp.status_code} - {resp.text}")
                 return False
@@ -58,71 +82,105 @@ class ApiClient:
             return False
 
     # ---------------- Local buffer ----------------
-    def _load_buffer(self) -> List[dict]:
+    def _migrate_legacy_buffer(self):
+        """Move rows from the old single-JSON-array buffer into the NDJSON file."""
+        if not os.path.exists(LEGACY_BUFFER_PATH):
+            return
+        try:
+            with open(LEGACY_BUFFER_PATH, "r", encoding="utf-8") as f:
+                rows = json.load(f)
+            with open(BUFFER_PATH, "ab") as f:
+                for row in rows:
+                    f.write(json.dumps(row).encode("utf-8") + b"\n")
+            os.remove(LEGACY_BUFFER_PATH)
+        except Exception:
+            pass
+
+    def _read_buffer(self) -> Tuple[List[dict], int]:
+        """Return buffered rows and the byte offset they were read up to."""
         if not os.path.exists(BUFFER_PATH):
-            return []
+            return [], 0
+        rows: List[dict] = []
         try:
-            with open(BUFFER_PATH, "r", encoding="utf-8") as f:
-                return json.load(f)
+            with open(BUFFER_PATH, "rb") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        rows.append(json.loads(line))
+                    except ValueError:
+                        print("Skipping corrupt buffered session")
+                return rows, f.tell()
         except Exception:
-            return []
+            return [], 0
 
-    def _save_buffer(self, rows: List[dict]):
+    def _drop_buffered(self, offset: int):
+        """Remove the first ``offset`` bytes, keeping rows appended since the read."""
+        tmp_path = BUFFER_PATH + ".tmp"
         try:
-            with open(BUFFER_PATH, "w", encoding="utf-8") as f:
-                json.dump(rows, f)
+            with open(BUFFER_PATH, "rb") as src, open(tmp_path, "wb") as dst:
+                src.seek(offset)
+                dst.write(src.read())
+            os.replace(tmp_path, BUFFER_PATH)
         except Exception:
             pass
 
-    def buffer_session(self, started_at: datetime, ended_at: datetime, blink_count: int, avg_cpu: float, avg_mem: float):
-        rows = self._load_buffer()
-        rows.append(
-            {
-                "started_at": started_at.isoformat(),
-                "ended_at": ended_at.isoformat(),
-                "blink_count": blink_count,
-                "avg_cpu": avg_cpu,
-                "avg_memory_mb": avg_mem,
-            }
-        )
-        self._save_buffer(rows)
+    @staticmethod
+    def _session_row(started_at: datetime, ended_at: datetime, blink_count: int, avg_cpu: float, avg_mem: float) -> dict:
+        return {
+            "started_at": started_at.isoformat(),
+            "ended_at": ended_at.isoformat(),
+            "blink_count": blink_count,
+            "avg_cpu": avg_cpu,
+            "avg_memory_mb": avg_mem,
+        }
+
+    def _append_buffer(self, row: dict):
+        try:
+            with open(BUFFER_PATH, "ab") as f:
+                f.write(json.dumps(row).encode("utf-8") + b"\n")
+        except Exception:
+            pass
 
     # ---------------- Sync with backend ----------------
-    def sync_buffer(self) -> int:
-        """Attempt to send any locally buffered sessions.
+    def _post_sessions(self, rows: List[dict]) -> bool:
+        """Send rows in one bulk request.
+
+        The backend inserts them in a single transaction, so they are either
+        all stored or none are.
+        """
+        url = f"{API_BASE_URL}/blink-sessions/bulk"
+        try:
+            resp = self._session.post(url, json=rows, timeout=30)
+            if resp.status_code == 200:
+                return True
+            print(f"Sync failed: HTTP {resp.status_code} - {resp.text}")
+        except Exception as e:
+            print(f"Sync error: {e}")
+        return False
+
+    def flush_session(self, started_at: datetime, ended_at: datetime, blink_count: int, avg_cpu: float, avg_mem: float) -> int:
+        """Send a finished session along with any buffered ones in one request.
 
+        If the request fails the session is buffered locally for a later sync.
         Returns number of sessions successfully synced.
         """
+        row = self._session_row(started_at, ended_at, blink_count, avg_cpu, avg_mem)
         if not self._token:
             print("Sync skipped: No authentication token")
+            self._append_buffer(row)
             return 0
 
-        rows = self._load_buffer()
-        if not rows:
-            print("Sync skipped: No buffered sessions")
+        rows, offset = self._read_buffer()
+        rows.append(row)
+        print(f"Attempting to sync {len(rows)} sessions")
+        if not self._post_sessions(rows):
+            self._append_buffer(row)
+            print(f"{len(rows)} sessions remain buffered for retry")
             return 0
 
-        print(f"Attempting to sync {len(rows)} buffered sessions")
-        headers = {"Authorization": f"Bearer {self._token}"}
-        url = f"{API_BASE_URL}/blink-sessions"
-        sent = 0
-        remaining: List[dict] = []
-
-        for row in rows:
-            try:
-                resp = requests.post(url, json=row, headers=headers, timeout=10)
-                if resp.status_code == 200:
-                    sent += 1
-                else:
-                    print(f"Sync failed for session: HTTP {resp.status_code} - {resp.text}")
-                    remaining.append(row)
-            except Exception as e:
-                print(f"Sync error for session: {e}")
-                remaining.append(row)
-
-        self._save_buffer(remaining)
-        if sent > 0:
-            print(f"Successfully synced {sent} sessions")
-        if remaining:
-            print(f"{len(remaining)} sessions remain buffered for retry")
-        return sent
+        if offset:
+            self._drop_buffered(offset)
+        print(f"Successfully synced {len(rows)} sessions")
+        return len(rows)
@@ -7,13 +7,13 @@ REM Install dependencies
 pip install -r requirements.txt
 
 REM Build with PyInstaller
-pyinstaller --onefile --windowed --name "WaW_EyeTracker" --icon "icon.ico" main.py
+pyinstaller --onefile --windowed --name "WaW_EyeTracker" --icon "icon.ico" --add-data "theme.qss;." main.py
 
 REM Create dist directory if it doesn't exist
 if not exist "dist" mkdir "dist"
 
 REM Copy additional files
-copy "blink_buffer.json" "dist\" 2>nul
+copy "blink_buffer.ndjson" "dist\" 2>nul
 copy ".token.json" "dist\" 2>nul
 
 echo Build complete! Executable is in dist\WaW_EyeTracker.exe
@@ -1,4 +1,8 @@
+import bisect
+import logging
+import os
 import sys
+import time
 from datetime import datetime, timezone
 
 from PyQt5 import QtCore, QtWidgets
@@ -8,7 +12,75 @@ from eye_tracker import EyeTrackerWorker
 from api_client import ApiClient
 
 
+# CPU% tier boundaries for the energy estimate: <20 Low, <60 Medium, else High
+_ENERGY_THRESHOLDS = (20.0, 60.0)
+_ENERGY_LABELS = ("Low", "Medium", "High")
+
+# Perf label formatters, bound once
+_CPU_FMT = "CPU: {:.1f} %".format
+_MEM_FMT = "Memory (process): {:.0f} MB".format
+_ENERGY_FMT = "Energy impact: approx {}".format
+
+THEME_PATH = os.path.join(os.path.dirname(__file__), "theme.qss")
+
+_INV_MB = 1.0 / (1024 * 1024)
+
+# Perf sampling interval. cpu_percent(interval=None) reports the average over
+# the wall time since the previous call, so a longer interval loses nothing;
+# it only means fewer wakeups when nobody is tracking.
+PERF_INTERVAL_TRACKING_MS = 2000
+PERF_INTERVAL_IDLE_MS = 5000
+
+# The blink-rate check piggybacks on the perf tick (only relevant while
+# tracking) instead of running its own timer: once a minute.
+BLINK_CHECK_EVERY_TICKS = 60000 // PERF_INTERVAL_TRACKING_MS
+
+
+class SyncSignals(QtCore.QObject):
+    # synced session count, error message ("" on success)
+    finished = QtCore.pyqtSignal(int, str)
+
+
+class SyncTask(QtCore.QRunnable):
+    """Sends a finished session (plus any offline backlog) off the GUI thread."""
+
+    def __init__(self, api: ApiClient, session: dict):
+        super().__init__()
+        self.api = api
+        self.session = session
+        self.signals = SyncSignals()
+
+    def run(self):
+        try:
+            synced = self.api.flush_session(**self.session)
+        except Exception as e:
+            self.signals.finished.emit(0, str(e))
+            return
+        self.signals.finished.emit(synced, "")
+
+
+class LoginSignals(QtCore.QObject):
+    finished = QtCore.pyqtSignal(bool)
+
+
+class LoginTask(QtCore.QRunnable):
+    """Authenticates against the backend off the GUI thread."""
+
+    def __init__(self, api: ApiClient, email: str, password: str):
+        super().__init__()
+        self.api = api
+        self.email = email
+        self.password = password
+        self.signals = LoginSignals()
+
+    def run(self):
+        self.signals.finished.emit(self.api.login(email=self.email, password=self.password))
+
+
 class MainWindow(QtWidgets.QMainWindow):
+    # Set once in main() after QApplication exists; shared by all windows
+    _tray_icon_cached = None
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Wellness at Work - Eye Tracker (Prototype)")
@@ -27,27 +99,54 @@ class MainWindow(QtWidgets.QMainWindow):
         # Eye tracker thread/worker
         self.tracker_thread = None
         self.tracker_worker = None
+        self._pending_session = None
+        self._tray_menu = None
 
         # Backend API client
         self.api = ApiClient()
 
+        # Network calls run here, one at a time so syncs never race on the
+        # local buffer file
+        self._net_pool = QtCore.QThreadPool(self)
+        self._net_pool.setMaxThreadCount(1)
+        self._sync_task = None
+        self._login_task = None
+
+        # Cached handle for this process; the first cpu_percent() call only
+        # primes the delta, so later calls report usage since the last one.
+        self._proc = psutil.Process()
+        self._proc.cpu_percent(interval=None)
+
         # Per-session metrics
-        self._session_start: datetime | None = None
-        self._cpu_samples: list[float] = []
-        self._mem_samples: list[float] = []
+        self._session_start: datetime | None = None  # UTC, for the API payload
+        self._session_start_mono = 0.0  # time.monotonic(), for durations
+        # Running totals so averages cost O(1) memory however long the session
+        self._cpu_sum = 0.0
+        self._mem_sum = 0.0
+        self._n_samples = 0
 
         # UI
         self._setup_ui()
 
+        # Tracked via show/hide events so the perf tick needn't ask Qt
+        self._window_visible = False
+
+        # Last text shown on each perf label; unchanged values skip setText
+        self._last_cpu_s = self.cpu_label.text()
+        self._last_mem_s = self.mem_label.text()
+        self._last_energy_s = self.energy_label.text()
+
         # Timers
         self.perf_timer = QtCore.QTimer(self)
         self.perf_timer.timeout.connect(self.update_performance_stats)
-        self.perf_timer.start(1000)  # every 1s
+        self.perf_timer.start(PERF_INTERVAL_IDLE_MS)
+        self._tick = 0
 
-        # Blink rate monitoring timer
-        self.blink_check_timer = QtCore.QTimer(self)
-        self.blink_check_timer.timeout.connect(self.check_blink_rate)
-        self.blink_check_timer.start(60000)  # every 1 minute
+        # Coalesces bursts of blink updates into one label repaint per 100 ms
+        self._blink_dirty = False
+        self._blink_flush_timer = QtCore.QTimer(self)
+        self._blink_flush_timer.setSingleShot(True)
+        self._blink_flush_timer.timeout.connect(self._flush_blink_label)
 
     def _setup_ui(self):
         central = QtWidgets.QWidget()
@@ -69,23 +168,24 @@ class MainWindow(QtWidgets.QMainWindow):
         auth_row.addWidget(self.login_btn)
 
         # Status and sync indicator
+        # Labels are styled by object name / dynamic properties in theme.qss
         self.status_label = QtWidgets.QLabel("Status: Not tracking")
-        self.status_label.setStyleSheet("color: #FFFFFF; font-size: 16px;")
+        self.status_label.setObjectName("statusLabel")
 
-        self.sync_label = QtWidgets.QLabel("Sync: Online")
-        self.sync_label.setStyleSheet("color: #4CAF50; font-size: 14px;")
+        self.sync_label = QtWidgets.QLabel()
+        self.sync_label.setObjectName("syncLabel")
+        self._sync_state = None
+        self._set_sync_state("online", "Sync: Online")
 
         self.blink_label = QtWidgets.QLabel("Blink count: 0")
-        self.blink_label.setStyleSheet(
-            "color: #FFFFFF; font-size: 24px; font-weight: bold;"
-        )
+        self.blink_label.setObjectName("blinkLabel")
 
         # Performance stats
         self.cpu_label = QtWidgets.QLabel("CPU: - %")
-        self.mem_label = QtWidgets.QLabel("Memory: - MB")
+        self.mem_label = QtWidgets.QLabel("Memory (process): - MB")
         self.energy_label = QtWidgets.QLabel("Energy impact: approx -")
         for lbl in (self.cpu_label, self.mem_label, self.energy_label):
-            lbl.setStyleSheet("color: #CCCCCC; font-size: 14px;")
+            lbl.setProperty("stat", True)
 
         # Buttons
         btn_row = QtWidgets.QHBoxLayout()
@@ -109,54 +209,78 @@ class MainWindow(QtWidgets.QMainWindow):
         layout.addStretch(1)
         layout.addLayout(btn_row)
 
-        # Dark theme
-        self.setStyleSheet(
-            "QMainWindow { background-color: #1E1E1E; }"
-            "QWidget { background-color: #1E1E1E; color: #FFFFFF; }"
-            "QPushButton { background-color: #2D2D2D; color: #FFFFFF; padding: 8px 16px; border-radius: 4px; }"
-            "QPushButton:disabled { background-color: #444444; }"
-            "QPushButton:hover:!disabled { background-color: #3A3A3A; }"
-        )
-
         self.setCentralWidget(central)
 
         # System tray
         self.setup_system_tray()
 
+    def _set_sync_state(self, state: str, text: str):
+        self.sync_label.setText(text)
+        if state != self._sync_state:
+            self._sync_state = state
+            # Re-resolve the already-parsed app stylesheet for the new state
+            self.sync_label.setProperty("state", state)
+            style = self.sync_label.style()
+            style.unpolish(self.sync_label)
+            style.polish(self.sync_label)
+
     def setup_system_tray(self):
         # Create system tray icon
         self.tray_icon = QtWidgets.QSystemTrayIcon(self)
-        self.tray_icon.setIcon(QtWidgets.QApplication.style().standardIcon(QtWidgets.QStyle.SP_ComputerIcon))
-        
-        # Create tray menu
-        tray_menu = QtWidgets.QMenu()
-        
-        show_action = tray_menu.addAction("Show")
-        show_action.triggered.connect(self.show)
-        
-        hide_action = tray_menu.addAction("Hide")
-        hide_action.triggered.connect(self.hide)
-        
-        tray_menu.addSeparator()
-        
-        quit_action = tray_menu.addAction("Quit")
-        quit_action.triggered.connect(QtWidgets.QApplication.quit)
+        if MainWindow._tray_icon_cached is None:
+            MainWindow._tray_icon_cached = QtWidgets.QApplication.style().standardIcon(
+                QtWidgets.QStyle.SP_ComputerIcon
+            )
+        self.tray_icon.setIcon(MainWindow._tray_icon_cached)
         
-        self.tray_icon.setContextMenu(tray_menu)
+        self.tray_icon.setContextMenu(self._build_tray_menu())
         self.tray_icon.show()
+        # Cached so periodic checks don't query the platform tray each time
+        self._tray_visible = True
         
         # Connect tray icon activation
         self.tray_icon.activated.connect(self.on_tray_activated)
 
+    def _build_tray_menu(self) -> QtWidgets.QMenu:
+        """Build the tray menu once; later calls return the same instance."""
+        if self._tray_menu is not None:
+            return self._tray_menu
+
+        # Parented to the window so it isn't garbage collected; everything
+        # here lives on the GUI thread, so connect directly.
+        self._tray_menu = QtWidgets.QMenu(self)
+        direct = QtCore.Qt.DirectConnection
+
+        show_action = self._tray_menu.addAction("Show")
+        show_action.triggered.connect(self.show, type=direct)
+
+        hide_action = self._tray_menu.addAction("Hide")
+        hide_action.triggered.connect(self.hide, type=direct)
+
+        self._tray_menu.addSeparator()
+
+        quit_action = self._tray_menu.addAction("Quit")
+        quit_action.triggered.connect(QtWidgets.QApplication.quit, type=direct)
+
+        return self._tray_menu
+
     def on_tray_activated(self, reason):
         if reason == QtWidgets.QSystemTrayIcon.DoubleClick:
             self.show()
             self.raise_()
             self.activateWindow()
 
+    def showEvent(self, event):
+        self._window_visible = True
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self._window_visible = False
+        super().hideEvent(event)
+
     def closeEvent(self, event):
         # Minimize to tray instead of closing
-        if self.tray_icon.isVisible():
+        if self._tray_visible:
             self.hide()
             self.tray_icon.showMessage(
                 "Wellness at Work",
@@ -178,21 +302,24 @@ class MainWindow(QtWidgets.QMainWindow):
         self.status_label.setText("Status: Logging in...")
         self.login_btn.setEnabled(False)
         self.login_btn.setText("Logging in...")
-        QtWidgets.QApplication.processEvents()
 
-        ok = self.api.login(email=email, password=password)
-        
+        task = LoginTask(self.api, email, password)
+        task.signals.finished.connect(self._on_login_done)
+        self._login_task = task  # keep the signals object alive until done
+        self._net_pool.start(task)
+
+    @QtCore.pyqtSlot(bool)
+    def _on_login_done(self, ok: bool):
+        self._login_task = None
         self.login_btn.setEnabled(True)
         self.login_btn.setText("Login")
 
         if ok:
             self.status_label.setText("Status: Logged in successfully")
-            self.sync_label.setText("Sync: Online")
-            self.sync_label.setStyleSheet("color: #4CAF50; font-size: 14px;")
+            self._set_sync_state("online", "Sync: Online")
         else:
             self.status_label.setText("Status: Login failed - check credentials and connection")
-            self.sync_label.setText("Sync: Offline")
-            self.sync_label.setStyleSheet("color: #F44336; font-size: 14px;")
+            self._set_sync_state("offline", "Sync: Offline")
 
     def start_tracking(self):
         if self.tracking:
@@ -211,8 +338,12 @@ class MainWindow(QtWidgets.QMainWindow):
 
         # Session metrics
         self._session_start = datetime.now(timezone.utc)
-        self._cpu_samples = []
-        self._mem_samples = []
+        self._session_start_mono = time.monotonic()
+        self._cpu_sum = 0.0
+        self._mem_sum = 0.0
+        self._n_samples = 0
+        self._tick = 0
+        self.perf_timer.setInterval(PERF_INTERVAL_TRACKING_MS)
 
         # Setup worker in background thread
         self.tracker_thread = QtCore.QThread(self)
@@ -224,6 +355,8 @@ class MainWindow(QtWidgets.QMainWindow):
         self.tracker_worker.blink_count_updated.connect(self.on_blink_count_updated)
         self.tracker_worker.status_message.connect(self.on_tracker_status)
         self.tracker_thread.finished.connect(self.tracker_worker.deleteLater)
+        self.tracker_thread.finished.connect(self.tracker_thread.deleteLater)
+        self.tracker_thread.finished.connect(self._on_tracker_finished)
 
         self.tracker_thread.start()
 
@@ -232,66 +365,78 @@ class MainWindow(QtWidgets.QMainWindow):
             return
 
         self.tracking = False
+        self.perf_timer.setInterval(PERF_INTERVAL_IDLE_MS)
+        self.stop_btn.setEnabled(False)
 
+        # Capture the session now; it is synced once the tracker thread exits
+        if self._session_start is not None:
+            self._set_sync_state("syncing", "Sync: Syncing...")
+            self._pending_session = dict(
+                started_at=self._session_start,
+                ended_at=datetime.now(),
+                blink_count=self.blink_count,
+                avg_cpu=self._cpu_sum / self._n_samples if self._n_samples else 0.0,
+                avg_mem=self._mem_sum / self._n_samples if self._n_samples else 0.0,
+            )
+        else:
+            self.status_label.setText("Status: Not tracking")
+
+        # Don't block the GUI waiting for the capture loop to notice stop();
+        # _on_tracker_finished continues once the thread has exited.
         if self.tracker_worker is not None:
             self.tracker_worker.stop()
         if self.tracker_thread is not None:
             self.tracker_thread.quit()
-            self.tracker_thread.wait()
-            self.tracker_thread = None
-            self.tracker_worker = None
+        else:
+            self._on_tracker_finished()
 
-        # Persist session and sync
-        if self._session_start is not None:
-            self.sync_label.setText("Sync: Syncing...")
-            self.sync_label.setStyleSheet("color: #FF9800; font-size: 14px;")
-
-            try:
-                ended_at = datetime.now()
-                avg_cpu = (
-                    sum(self._cpu_samples) / len(self._cpu_samples)
-                    if self._cpu_samples
-                    else 0.0
-                )
-                avg_mem = (
-                    sum(self._mem_samples) / len(self._mem_samples)
-                    if self._mem_samples
-                    else 0.0
-                )
+    @QtCore.pyqtSlot()
+    def _on_tracker_finished(self):
+        self.tracker_thread = None
+        self.tracker_worker = None
 
-                self.api.buffer_session(
-                    started_at=self._session_start,
-                    ended_at=ended_at,
-                    blink_count=self.blink_count,
-                    avg_cpu=avg_cpu,
-                    avg_mem=avg_mem,
-                )
+        session, self._pending_session = self._pending_session, None
+        if session is not None:
+            # One request carries this session plus any offline backlog;
+            # on failure the session is buffered for the next sync.
+            task = SyncTask(self.api, session)
+            task.signals.finished.connect(self._on_sync_done)
+            self._sync_task = task  # keep the signals object alive until done
+            self._net_pool.start(task)
 
-                synced = self.api.sync_buffer()
-                if synced > 0:
-                    self.status_label.setText(
-                        f"Status: Not tracking (synced {synced} sessions)"
-                    )
-                    self.sync_label.setText("Sync: Online")
-                    self.sync_label.setStyleSheet("color: #4CAF50; font-size: 14px;")
-                else:
-                    self.status_label.setText("Status: Not tracking (offline - buffered)")
-                    self.sync_label.setText("Sync: Offline")
-                    self.sync_label.setStyleSheet("color: #F44336; font-size: 14px;")
-            except Exception as e:
+        self.start_btn.setEnabled(True)
+
+    @QtCore.pyqtSlot(int, str)
+    def _on_sync_done(self, synced: int, err: str):
+        self._sync_task = None
+        # A new session may have started while the sync was in flight
+        show_status = not self.tracking
+
+        if err:
+            if show_status:
                 self.status_label.setText("Status: Not tracking (sync failed)")
-                self.sync_label.setText("Sync: Error")
-                self.sync_label.setStyleSheet("color: #F44336; font-size: 14px;")
-                print(f"Sync error: {e}")  # Add logging for debugging
+            self._set_sync_state("error", "Sync: Error")
+            print(f"Sync error: {err}")  # Add logging for debugging
+        elif synced > 0:
+            if show_status:
+                self.status_label.setText(
+                    f"Status: Not tracking (synced {synced} sessions)"
+                )
+            self._set_sync_state("online", "Sync: Online")
         else:
-            self.status_label.setText("Status: Not tracking")
-
-        self.start_btn.setEnabled(True)
-        self.stop_btn.setEnabled(False)
+            if show_status:
+                self.status_label.setText("Status: Not tracking (offline - buffered)")
+            self._set_sync_state("offline", "Sync: Offline")
 
     @QtCore.pyqtSlot(int)
     def on_blink_count_updated(self, count: int):
         self.blink_count = count
+        if not self._blink_dirty:
+            self._blink_dirty = True
+            self._blink_flush_timer.start(100)
+
+    def _flush_blink_label(self):
+        self._blink_dirty = False
         self.blink_label.setText(f"Blink count: {self.blink_count}")
 
     @QtCore.pyqtSlot(str)
@@ -299,41 +444,56 @@ class MainWindow(QtWidgets.QMainWindow):
         self.status_label.setText(f"Status: {message}")
 
     def update_performance_stats(self):
-        # CPU in %
-        cpu = psutil.cpu_percent(interval=None)
-        mem = psutil.virtual_memory().used / (1024 * 1024)  # MB
+        # oneshot() batches the /proc reads behind both calls
+        with self._proc.oneshot():
+            cpu = self._proc.cpu_percent(interval=None)  # %
+            mem = self._proc.memory_info().rss * _INV_MB  # MB
 
         if self.tracking:
-            self._cpu_samples.append(cpu)
-            self._mem_samples.append(mem)
+            self._cpu_sum += cpu
+            self._mem_sum += mem
+            self._n_samples += 1
+
+            self._tick += 1
+            if self._tick % BLINK_CHECK_EVERY_TICKS == 0:
+                self.check_blink_rate()
 
         # Power usage estimation (placeholder - would need OS-specific APIs for actual power monitoring)
         # Windows: Could use WMI, macOS: ioreg, Linux: /sys/class/power_supply/
         # For MVP, we use CPU-based approximation
         # TODO: With more time, implement platform-specific power monitoring APIs
-        if cpu < 20:
-            energy = "Low"
-        elif cpu < 60:
-            energy = "Medium"
-        else:
-            energy = "High"
+        # bisect_right so a value equal to a boundary lands in the upper tier
+        energy = _ENERGY_LABELS[bisect.bisect_right(_ENERGY_THRESHOLDS, cpu)]
 
-        self.cpu_label.setText(f"CPU: {cpu:.1f} %")
-        self.mem_label.setText(f"Memory: {mem:.0f} MB")
-        self.energy_label.setText(f"Energy impact: approx {energy}")
+        # Hidden to the tray: keep sampling above, but skip repainting labels
+        if not self._window_visible:
+            return
+
+        s = _CPU_FMT(cpu)
+        if s != self._last_cpu_s:
+            self.cpu_label.setText(s)
+            self._last_cpu_s = s
+        s = _MEM_FMT(mem)
+        if s != self._last_mem_s:
+            self.mem_label.setText(s)
+            self._last_mem_s = s
+        s = _ENERGY_FMT(energy)
+        if s != self._last_energy_s:
+            self.energy_label.setText(s)
+            self._last_energy_s = s
 
     def check_blink_rate(self):
         if not self.tracking or self._session_start is None:
             return
         
         # Calculate blinks per minute
-        session_duration_minutes = (datetime.now(timezone.utc) - self._session_start).total_seconds() / 60
+        session_duration_minutes = (time.monotonic() - self._session_start_mono) / 60.0
         if session_duration_minutes > 0:
             blink_rate = self.blink_count / session_duration_minutes
             
             # Alert if blink rate is below 10 blinks per minute (considered low)
             if blink_rate < 10:
-                if self.tray_icon.isVisible():
+                if self._tray_visible:
                     self.tray_icon.showMessage(
                         "Low Blink Rate Alert",
                         f"Your current blink rate is {blink_rate:.1f} blinks/min. Consider taking a break!",
@@ -342,8 +502,23 @@ class MainWindow(QtWidgets.QMainWindow):
                     )
 
 
+def apply_theme(app: QtWidgets.QApplication):
+    """Install the dark theme once for the whole application."""
+    try:
+        with open(THEME_PATH, "r", encoding="utf-8") as f:
+            app.setStyleSheet(f.read())
+    except OSError as e:
+        print(f"Theme not loaded: {e}")
+
+
 def main():
+    logging.basicConfig(
+        level=os.getenv("WAW_LOG_LEVEL", "WARNING").upper(),
+        format="%(asctime)s [%(name)s] %(levelname)s: %(message)s",
+    )
     app = QtWidgets.QApplication(sys.argv)
+    apply_theme(app)
+    MainWindow._tray_icon_cached = app.style().standardIcon(QtWidgets.QStyle.SP_ComputerIcon)
     window = MainWindow()
     window.show()
     sys.exit(app.exec_())